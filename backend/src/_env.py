@@ -0,0 +1,4 @@
+"""Loads .env.local once per process; Python's module cache makes repeat imports free."""
+from dotenv import load_dotenv
+
+load_dotenv(".env.local")
@@ -0,0 +1,66 @@
+"""File helpers shared by the agents that save orders and leads."""
+import logging
+import os
+import tempfile
+
+import orjson
+
+# Deletes every ASCII character except letters, digits and "_" when used with str.translate
+SAFE_FILENAME_TABLE = {
+    i: None for i in range(128) if not (chr(i).isalnum() or chr(i) == "_")
+}
+
+logger = logging.getLogger(__name__)
+
+# Read the umask once (it can only be read by setting it) so saved files get the
+# same mode a plain open(..., "w") would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+def safe_filename(name: str, default: str) -> str:
+    """Strip `name` down to characters that are safe in a filename."""
+    return name.translate(SAFE_FILENAME_TABLE) or default
+
+
+def write_bytes_atomic(filename: str, payload: bytes) -> None:
+    """Write `payload` to `filename` in one step."""
+    # Write to a unique temp file in the same directory, then swap it in so a
+    # crash never leaves half a file and concurrent saves don't collide
+    tmp = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(filename) or ".", prefix=f"{os.path.basename(filename)}.", suffix=".tmp", delete=False
+    )
+    try:
+        with tmp:
+            tmp.write(payload)
+        # NamedTemporaryFile creates 0600 files and os.replace keeps that mode
+        os.chmod(tmp.name, FILE_MODE)
+        os.replace(tmp.name, filename)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+
+def write_json_atomic(filename: str, data) -> None:
+    """Write `data` as indented JSON, replacing `filename` in one step."""
+    write_bytes_atomic(filename, orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+
+def migrate_json_array_to_jsonl(legacy_filename: str, filename: str) -> int:
+    """One-time upgrade of a JSON-array history file to JSONL.
+
+    Does nothing once `filename` exists; the legacy file is left in place.
+    Returns the number of records carried over.
+    """
+    if os.path.exists(filename) or not os.path.exists(legacy_filename):
+        return 0
+    with open(legacy_filename, "rb") as f:
+        try:
+            records = orjson.loads(f.read() or b"[]")
+        except orjson.JSONDecodeError:
+            logger.warning(f"Could not parse {legacy_filename}; not migrating it to {filename}")
+            return 0
+    write_bytes_atomic(filename, b"".join(orjson.dumps(r) + b"\n" for r in records))
+    logger.info(f"Migrated {len(records)} records from {legacy_filename} to {filename}")
+    return len(records)
@@ -0,0 +1,12 @@
+"""Per-process turn detector shared by every job a worker runs."""
+from livekit.agents import JobProcess
+from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+
+def get_turn_detector(proc: JobProcess) -> MultilingualModel:
+    # MultilingualModel binds to the job's inference executor, so it can't be
+    # built in prewarm; build it on the first job and reuse it afterwards
+    turn_detector = proc.userdata.get("turn_detector")
+    if turn_detector is None:
+        turn_detector = proc.userdata["turn_detector"] = MultilingualModel()
+    return turn_detector
@@ -1,11 +1,16 @@
+import asyncio
+import functools
 import logging
-import json
+import orjson
 import os
-import datetime
+import sys
+from datetime import datetime
 import uuid
 from typing import List, Optional
 from dataclasses import dataclass
-from dotenv import load_dotenv
+import _env  # noqa: F401 - loads .env.local
+from _files import migrate_json_array_to_jsonl
+from _turn_detector import get_turn_detector
 from pydantic import BaseModel
 
 from livekit.agents import (
@@ -23,13 +28,15 @@ from livekit.agents import (
     RunContext,
 )
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("shopping-agent")
-load_dotenv(".env.local")
 
 CATALOG_FILE = "acp_catalog.json"
-ORDERS_FILE = "orders_acp.json"
+ORDERS_FILE = "orders_acp.jsonl"
+LEGACY_ORDERS_FILE = "orders_acp.json"  # JSON array used before orders moved to JSONL
+MAX_LISTED_PRODUCTS = 20  # More results than this aren't useful to read out by voice
+ORDER_FLUSH_BATCH = 64  # Max orders written per flush
+ORDER_FLUSH_INTERVAL = 0.05  # Seconds to wait for more orders before flushing
 
 # --- Commerce Logic Layer (The "Merchant API") ---
 
@@ -42,25 +49,154 @@ class ListProductsArgs(BaseModel):
 def load_catalog():
     if not os.path.exists(CATALOG_FILE):
         return []
-    with open(CATALOG_FILE, "r") as f:
-        return json.load(f)
+    with open(CATALOG_FILE, "rb") as f:
+        return orjson.loads(f.read())
 
 def load_orders():
     if not os.path.exists(ORDERS_FILE):
         return []
-    try:
-        with open(ORDERS_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
+    orders = []
+    with open(ORDERS_FILE, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                orders.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                logger.warning(f"Skipping malformed order line in {ORDERS_FILE}")
+    return orders
+
+# Deployments from before the JSONL switch keep their order history
+migrate_json_array_to_jsonl(LEGACY_ORDERS_FILE, ORDERS_FILE)
+# Orders are read from disk once; afterwards the cache is the source of truth
+_ORDERS_CACHE = load_orders()
+
+_order_queue: Optional[asyncio.Queue] = None
+_order_writer: Optional[asyncio.Task] = None
+
+def write_order_lines(lines: List[bytes]):
+    # Append-only JSONL: one write + fsync for the whole batch
+    with open(ORDERS_FILE, "ab") as f:
+        f.write(b"".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+async def order_writer(queue: asyncio.Queue):
+    """Drain queued orders, batching up to ORDER_FLUSH_BATCH or ORDER_FLUSH_INTERVAL."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + ORDER_FLUSH_INTERVAL
+        while len(batch) < ORDER_FLUSH_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await asyncio.to_thread(write_order_lines, batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} orders to {ORDERS_FILE}: {e}")
+        finally:
+            for _ in batch:
+                queue.task_done()
 
 def save_order_to_db(order):
-    orders = load_orders()
-    orders.append(order)
-    with open(ORDERS_FILE, "w") as f:
-        json.dump(orders, f, indent=2)
+    global _order_queue, _order_writer
+    _ORDERS_CACHE.append(order)
+    if _order_queue is None:
+        _order_queue = asyncio.Queue()
+        _order_writer = asyncio.create_task(order_writer(_order_queue))
+    _order_queue.put_nowait(orjson.dumps(order) + b"\n")
+
+async def flush_orders():
+    """Wait until every queued order has been written to disk."""
+    if _order_queue is not None:
+        await _order_queue.join()
+
+def index_catalog(catalog):
+    """Cache numeric price and lowercased search fields on each item for list_products."""
+    for item in catalog:
+        # Low-cardinality values repeat across items; intern them so copies are shared
+        for key in ("category", "color", "currency", "size"):
+            if isinstance(item.get(key), str):
+                item[key] = sys.intern(item[key])
+        item["_price"] = float(item.get("price", 0))
+        item["_name_lower"] = item.get("name", "").lower()
+        item["_category_lower"] = sys.intern(item.get("category", "").lower())
+        item["_id_lower"] = item.get("id", "").lower()
+        item["_color_lower"] = sys.intern(item.get("color", "").lower())
+        item["_size_lower"] = sys.intern(str(item.get("size", "")).lower())
+        fields = [
+            item["_name_lower"],
+            item["_category_lower"],
+            item["_id_lower"],
+            item["_color_lower"],
+            item["_size_lower"],
+        ]
+        fields.extend(str(tag).lower() for tag in item.get("tags", []))
+        # Newline-separated so a term can't match across two fields
+        item["_blob"] = "\n".join(fields)
+    return catalog
+
+CATALOG = index_catalog(load_catalog())
+CATALOG_BY_ID = {p["id"]: p for p in CATALOG}
+
+# CATALOG is loaded once per process, so cached results never go stale.
+# Call filter_catalog.cache_clear() if a catalog reload path is ever added.
+@functools.lru_cache(maxsize=512)
+def filter_catalog(
+    category: Optional[str],
+    max_price: Optional[float],
+    color: Optional[str],
+    search_query: Optional[str],
+) -> str:
+    """Return the list_products summary; all string arguments must be lowercased."""
+    # Every query word must appear somewhere, in any order ("black hoodie")
+    query_tokens = search_query.split() if search_query else []
+
+    # Filter and format in one pass, stopping once the cap is exceeded
+    summary = []
+    truncated = False
+    for item in CATALOG:
+        # Cheapest predicates first so most misses exit early
+        # max_price: compare numerically
+        if max_price is not None and item["_price"] > max_price:
+            continue
+
+        # color exact-ish match
+        if color and color != item["_color_lower"]:
+            continue
+
+        # Category: if provided, allow matching against category OR name/id/tags
+        # (_blob holds the lowercased name/category/id/color/size/tags)
+        if category and category not in item["_blob"]:
+            continue
+
+        # general search query: match across name/id/category/color/size/tags
+        if query_tokens and not all(tok in item["_blob"] for tok in query_tokens):
+            continue
+
+        if len(summary) >= MAX_LISTED_PRODUCTS:
+            truncated = True
+            break
+
+        # Present consistent summary using fields present in acp_catalog.json
+        price = item.get("price", "")
+        currency = item.get("currency", "")
+        size = f" | Size: {item['size']}" if "size" in item else ""
+        summary.append(f"ID: {item.get('id','')} | Name: {item.get('name','')} | Price: {price} {currency}{size}")
+
+    if not summary:
+        return "No products found matching those criteria."
 
-CATALOG = load_catalog()
+    if truncated:
+        summary.append(f"(showing first {MAX_LISTED_PRODUCTS})")
+
+    return "\n".join(summary)
 
 # --- Agent Definition ---
 
@@ -95,64 +231,13 @@ class ShoppingAssistant(Agent):
         Search and filter products in the catalog. Works with acp_catalog.json entries
         (id, name, price (int), currency, category, color, optional size).
         """
-        category = args.category
-        max_price = args.max_price
-        color = args.color
-        search_query = args.search_query
-
-        def matches_term(item: dict, term: str) -> bool:
-            t = term.lower()
-            if t in item.get("name", "").lower():
-                return True
-            if t in item.get("category", "").lower():
-                return True
-            if t in item.get("id", "").lower():
-                return True
-            if t in item.get("color", "").lower():
-                return True
-            if t in str(item.get("size", "")).lower():
-                return True
-            tags = item.get("tags", [])
-            if tags and any(t in str(tag).lower() for tag in tags):
-                return True
-            return False
-
-        results = []
-        for item in CATALOG:
-            # Ensure required shape
-            item_price = float(item.get("price", 0))
-            item_currency = item.get("currency", "")
-
-            # Category: if provided, allow matching against category OR name/id/tags
-            if category and not matches_term(item, category):
-                continue
-
-            # max_price: compare numerically
-            if max_price is not None and item_price > float(max_price):
-                continue
-
-            # color exact-ish match
-            if color and color.lower() != item.get("color", "").lower():
-                continue
-
-            # general search query: match across name/id/category/color/size/tags
-            if search_query and not matches_term(item, search_query):
-                continue
-
-            results.append(item)
-
-        if not results:
-            return "No products found matching those criteria."
-
-        # Present consistent summary using fields present in acp_catalog.json
-        summary = []
-        for i in results:
-            price = i.get("price", "")
-            currency = i.get("currency", "")
-            size = f" | Size: {i['size']}" if "size" in i else ""
-            summary.append(f"ID: {i.get('id','')} | Name: {i.get('name','')} | Price: {price} {currency}{size}")
-
-        return "\n".join(summary)
+        # Normalize before the cached lookup so equivalent queries share an entry
+        return filter_catalog(
+            args.category.lower() if args.category else None,
+            float(args.max_price) if args.max_price is not None else None,
+            args.color.lower() if args.color else None,
+            " ".join(args.search_query.lower().split()) if args.search_query else None,
+        )
 
     @function_tool
     async def create_order(
@@ -169,7 +254,7 @@ class ShoppingAssistant(Agent):
             quantity: The quantity to purchase. Defaults to 1.
         """
         # 1. Lookup Product
-        product = next((p for p in CATALOG if p["id"] == product_id), None)
+        product = CATALOG_BY_ID.get(product_id)
         if not product:
             return f"Error: Product ID '{product_id}' not found."
 
@@ -189,7 +274,7 @@ class ShoppingAssistant(Agent):
             ],
             "total": total_price,
             "currency": product["currency"],
-            "created_at": datetime.datetime.now().isoformat()
+            "created_at": datetime.now().isoformat()
         }
 
         # 3. Persist
@@ -202,11 +287,10 @@ class ShoppingAssistant(Agent):
         """
         Retrieve details of the most recently placed order.
         """
-        orders = load_orders()
-        if not orders:
+        if not _ORDERS_CACHE:
             return "No recent orders found."
         
-        last = orders[-1]
+        last = _ORDERS_CACHE[-1]
         item_summary = ", ".join([f"{i['quantity']}x {i['name']}" for i in last['items']])
         return f"Last Order ({last['created_at']}): {item_summary}. Total: {last['total']} {last['currency']}."
 
@@ -214,6 +298,8 @@ class ShoppingAssistant(Agent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    proc.userdata["bvc"] = noise_cancellation.BVC()
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
@@ -224,10 +310,10 @@ async def entrypoint(ctx: JobContext):
         tts=murf.TTS(
             voice="en-US-alicia", 
             style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+            tokenizer=ctx.proc.userdata["tokenizer"],
             text_pacing=True
         ),
-        turn_detection=MultilingualModel(),
+        turn_detection=get_turn_detector(ctx.proc),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
     )
@@ -244,12 +330,13 @@ async def entrypoint(ctx: JobContext):
         logger.info(f"Usage: {summary}")
 
     ctx.add_shutdown_callback(log_usage)
+    ctx.add_shutdown_callback(flush_orders)
 
     await session.start(
         agent=ShoppingAssistant(),
         room=ctx.room,
         room_input_options=RoomInputOptions(
-            noise_cancellation=noise_cancellation.BVC(),
+            noise_cancellation=ctx.proc.userdata["bvc"],
         ),
     )
 
@@ -1,6 +1,6 @@
 import logging
 
-from dotenv import load_dotenv
+import _env  # noqa: F401 - loads .env.local
 from livekit.agents import (
     Agent,
     AgentSession,
@@ -20,8 +20,6 @@ from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("agent")
 
-load_dotenv(".env.local")
-
 
 class Assistant(Agent):
     def __init__(self) -> None:
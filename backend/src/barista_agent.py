@@ -1,9 +1,11 @@
 import logging
-import json
+import orjson
 import os
 from typing import List, Optional, Annotated
 from dataclasses import dataclass, field
-from dotenv import load_dotenv
+import _env  # noqa: F401 - loads .env.local
+from _files import safe_filename, write_json_atomic
+from _turn_detector import get_turn_detector
 
 from livekit.agents import (
     Agent,
@@ -20,12 +22,9 @@ from livekit.agents import (
     RunContext
 )
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("agent")
 
-load_dotenv(".env.local")
-
 # 1. Define the Order State Structure (The Data)
 @dataclass
 class OrderState:
@@ -49,6 +48,25 @@ class OrderState:
             "name": self.name
         }
 
+    def summary(self) -> str:
+        extras = ", ".join(self.extras) if self.extras else "None"
+        return (
+            f"Drink={self.drink_type or '?'}, Size={self.size or '?'}, "
+            f"Milk={self.milk or '?'}, Extras={extras}, Name={self.name or '?'}"
+        )
+
+    def update(self, drink_type=None, size=None, milk=None, extras=None, name=None):
+        # Empty values mean "not mentioned"; extras=[] is a real answer ("no extras")
+        if drink_type: self.drink_type = drink_type
+        if size: self.size = size
+        if milk: self.milk = milk
+        if extras is not None: self.extras = extras
+        if name: self.name = name
+
+    def dump(self) -> str:
+        # Only the final read-back needs the full JSON; partial updates use summary()
+        return orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2).decode()
+
 # 2. Define the Session Userdata (Holds the State)
 @dataclass
 class SessionState:
@@ -95,11 +113,7 @@ class BaristaAgent(Agent):
         current_order = ctx.userdata.order
 
         # Update fields if provided
-        if drink_type: current_order.drink_type = drink_type
-        if size: current_order.size = size
-        if milk: current_order.milk = milk
-        if extras is not None: current_order.extras = extras
-        if name: current_order.name = name
+        current_order.update(drink_type=drink_type, size=size, milk=milk, extras=extras, name=name)
 
         # Check what is missing
         missing_fields = []
@@ -109,12 +123,11 @@ class BaristaAgent(Agent):
         if not current_order.name: missing_fields.append("Customer Name")
         # We treat empty extras as valid if the rest is filled, but strictly we want them to confirm "no extras"
         
-        state_dump = json.dumps(current_order.to_dict(), indent=2)
-        
         if missing_fields:
-            return f"Order Updated.\nCurrent State: {state_dump}\nMISSING: {', '.join(missing_fields)}. Please ask for these."
+            # Partial updates only need a compact summary; skip the JSON dump
+            return f"Order Updated.\nCurrent State: {current_order.summary()}\nMISSING: {', '.join(missing_fields)}. Please ask for these."
         else:
-            return f"Order Complete! Details: {state_dump}. Please read this back to the user for confirmation."
+            return f"Order Complete! Details: {current_order.dump()}. Please read this back to the user for confirmation."
 
     @function_tool
     async def submit_order(self, ctx: RunContext[SessionState]):
@@ -127,12 +140,11 @@ class BaristaAgent(Agent):
             return "Order is incomplete. Please check missing fields before submitting."
 
         # Create a filename
-        safe_name = "".join(x for x in (order.name or "customer") if x.isalnum())
+        safe_name = safe_filename(order.name or "", "customer")
         filename = f"order_{safe_name}.json"
 
         try:
-            with open(filename, "w") as f:
-                json.dump(order.to_dict(), f, indent=2)
+            write_json_atomic(filename, order.to_dict())
             return f"Order successfully submitted and saved to {filename}. Thank the customer and end the interaction."
         except Exception as e:
             return f"Error saving file: {e}"
@@ -140,6 +152,8 @@ class BaristaAgent(Agent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    proc.userdata["bvc"] = noise_cancellation.BVC()
 
 
 async def entrypoint(ctx: JobContext):
@@ -160,10 +174,10 @@ async def entrypoint(ctx: JobContext):
         tts=murf.TTS(
             voice="en-US-matthew", 
             style="Conversation",
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+            tokenizer=ctx.proc.userdata["tokenizer"],
             text_pacing=True
         ),
-        turn_detection=MultilingualModel(),
+        turn_detection=get_turn_detector(ctx.proc),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
     )
@@ -185,7 +199,7 @@ async def entrypoint(ctx: JobContext):
         agent=BaristaAgent(),
         room=ctx.room,
         room_input_options=RoomInputOptions(
-            noise_cancellation=noise_cancellation.BVC(),
+            noise_cancellation=ctx.proc.userdata["bvc"],
         ),
     )
 
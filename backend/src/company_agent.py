@@ -1,9 +1,12 @@
 import logging
-import json
+import orjson
 import os
+import re
 from typing import List, Optional
-from dataclasses import dataclass, field, asdict
-from dotenv import load_dotenv
+from dataclasses import dataclass, field
+import _env  # noqa: F401 - loads .env.local
+from _files import safe_filename, write_json_atomic
+from _turn_detector import get_turn_detector
 
 from livekit.agents import (
     Agent,
@@ -20,24 +23,73 @@ from livekit.agents import (
     RunContext
 )
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("sdr-agent")
-load_dotenv(".env.local")
 
 DATA_FILE = "company_data.json"
+MAX_LOOKUP_RESULTS = 3  # Top matches returned by lookup_info
 
 # --- Data Loading ---
 def load_company_data():
     if not os.path.exists(DATA_FILE):
         logger.warning(f"{DATA_FILE} not found. Agent will have limited knowledge.")
         return {}
-    with open(DATA_FILE, "r") as f:
-        return json.load(f)
+    with open(DATA_FILE, "rb") as f:
+        data = orjson.loads(f.read())
+    # The corpus is static, so lowercase the searchable fields once here
+    for prod in data.get("products", []):
+        prod["_name_lower"] = prod["name"].lower()
+        prod["_keywords_lower"] = [k.lower() for k in prod.get("keywords", [])]
+    for faq in data.get("faqs", []):
+        faq["_q_lower"] = faq["question"].lower()
+        faq["_keywords_lower"] = [k.lower() for k in faq.get("keywords", [])]
+    return data
 
 COMPANY_DATA = load_company_data()
+PRODUCTS = COMPANY_DATA.get("products", [])
+FAQS = COMPANY_DATA.get("faqs", [])
+
+_PRICING_RE = re.compile(r"\b(?:price|cost|fee|charge)")
+
+def keyword_match(item, query: str) -> bool:
+    # Substring match on purpose: "documentation" hits "document", "taxes" hits "tax"
+    return any(k in query for k in item["_keywords_lower"])
+
+def search_knowledge_base(query: str) -> str:
+    query = query.lower()
+    results = []
+
+    def add(text) -> bool:
+        # Each item is visited once; report True once enough results are collected
+        results.append(text)
+        return len(results) >= MAX_LOOKUP_RESULTS
+
+    # 1. Search Products
+    for prod in PRODUCTS:
+        if keyword_match(prod, query) or prod["_name_lower"] in query:
+            if add(f"Product: {prod['name']} - {prod['description']}"):
+                break
+
+    # 2. Search FAQs
+    if len(results) < MAX_LOOKUP_RESULTS:
+        for faq in FAQS:
+            if keyword_match(faq, query) or query in faq["_q_lower"]:
+                if add(f"FAQ: Q: {faq['question']} A: {faq['answer']}"):
+                    break
+
+    # 3. Check Pricing
+    if len(results) < MAX_LOOKUP_RESULTS and _PRICING_RE.search(query):
+        p = COMPANY_DATA.get("pricing", {})
+        add(f"Pricing: Standard: {p.get('standard')} Setup Fee: {p.get('setup_fee')}")
+
+    if not results:
+        return "No specific info found in knowledge base. Please ask the user for clarification or offer general help."
+
+    return "\n".join(results)
 
 # --- State Management ---
+LEAD_FIELDS = ("name", "company", "email", "role", "use_case", "team_size", "timeline")
+
 @dataclass
 class LeadProfile:
     name: Optional[str] = None
@@ -49,7 +101,15 @@ class LeadProfile:
     timeline: Optional[str] = None # e.g., "Immediate", "Q3", "Exploring"
 
     def to_dict(self):
-        return asdict(self)
+        return {
+            "name": self.name,
+            "company": self.company,
+            "email": self.email,
+            "role": self.role,
+            "use_case": self.use_case,
+            "team_size": self.team_size,
+            "timeline": self.timeline,
+        }
 
     @property
     def is_complete(self):
@@ -92,28 +152,7 @@ class RazorpaySDR(Agent):
         Search the Razorpay knowledge base for answers regarding pricing, products, or FAQs.
         Use this whenever the user asks "What is...", "How much...", "Do you have...", etc.
         """
-        query = query.lower()
-        results = []
-
-        # 1. Search Products
-        for prod in COMPANY_DATA.get("products", []):
-            if any(k in query for k in prod.get("keywords", [])) or prod["name"].lower() in query:
-                results.append(f"Product: {prod['name']} - {prod['description']}")
-
-        # 2. Search FAQs
-        for faq in COMPANY_DATA.get("faqs", []):
-            if any(k in query for k in faq.get("keywords", [])) or query in faq["question"].lower():
-                results.append(f"FAQ: Q: {faq['question']} A: {faq['answer']}")
-
-        # 3. Check Pricing
-        if "price" in query or "cost" in query or "fee" in query or "charge" in query:
-            p = COMPANY_DATA.get("pricing", {})
-            results.append(f"Pricing: Standard: {p.get('standard')} Setup Fee: {p.get('setup_fee')}")
-
-        if not results:
-            return "No specific info found in knowledge base. Please ask the user for clarification or offer general help."
-        
-        return "\n".join(results[:3]) # Return top 3 matches
+        return search_knowledge_base(query)
 
     @function_tool
     async def update_lead_info(
@@ -140,7 +179,7 @@ class RazorpaySDR(Agent):
         if team_size: lead.team_size = team_size
         if timeline: lead.timeline = timeline
         
-        captured = [k for k, v in lead.to_dict().items() if v]
+        captured = [f for f in LEAD_FIELDS if getattr(lead, f)]
         return f"Lead info updated. Fields captured so far: {', '.join(captured)}"
 
     @function_tool
@@ -155,11 +194,11 @@ class RazorpaySDR(Agent):
         if not lead.name:
             lead.name = "Anonymous_User"
         
-        filename = f"lead_{lead.name.replace(' ', '_')}.json"
+        safe_name = safe_filename(lead.name.replace(" ", "_"), "Anonymous_User")
+        filename = f"lead_{safe_name}.json"
         
         try:
-            with open(filename, "w") as f:
-                json.dump(lead.to_dict(), f, indent=2)
+            write_json_atomic(filename, lead.to_dict())
             return f"Lead saved to {filename}. You may now give a friendly goodbye."
         except Exception as e:
             return f"Error saving lead: {e}"
@@ -168,6 +207,8 @@ class RazorpaySDR(Agent):
 
 def prewarm(proc: JobProcess):
     proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["tokenizer"] = tokenize.basic.SentenceTokenizer(min_sentence_len=2)
+    proc.userdata["bvc"] = noise_cancellation.BVC()
 
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
@@ -182,10 +223,10 @@ async def entrypoint(ctx: JobContext):
         tts=murf.TTS(
             # voice="en-US-alicia", # A friendly female voice
             # style="Conversation",       # Professional/Upbeat style
-            tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+            tokenizer=ctx.proc.userdata["tokenizer"],
             # text_pacing=True
         ),
-        turn_detection=MultilingualModel(),
+        turn_detection=get_turn_detector(ctx.proc),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
     )
@@ -207,7 +248,7 @@ async def entrypoint(ctx: JobContext):
         agent=RazorpaySDR(),
         room=ctx.room,
         room_input_options=RoomInputOptions(
-            noise_cancellation=noise_cancellation.BVC(),
+            noise_cancellation=ctx.proc.userdata["bvc"],
         ),
     )
 
@@ -1,10 +1,16 @@
+import asyncio
 import logging
-import json
+import orjson
 import os
+import re
+import sys
 import datetime
-from typing import List, Optional, Dict
-from dataclasses import dataclass, field, asdict
-from dotenv import load_dotenv
+from typing import List, Optional, Dict, Set
+from dataclasses import dataclass, field
+from rapidfuzz import fuzz, process
+import _env  # noqa: F401 - loads .env.local
+from _files import migrate_json_array_to_jsonl
+from _turn_detector import get_turn_detector
 
 from livekit.agents import (
     Agent,
@@ -21,45 +27,73 @@ from livekit.agents import (
     RunContext,
 )
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("grocery-agent")
-load_dotenv(".env.local")
 
 CATALOG_FILE = "grocery_catalog.json"
-ORDERS_FILE = "orders.json"
+ORDERS_FILE = "orders.jsonl"
+LEGACY_ORDERS_FILE = "orders.json"  # JSON array used before orders moved to JSONL
+FUZZY_MIN_QUERY_LEN = 5  # Shorter queries only match by substring
+FUZZY_SCORE_CUTOFF = 85
 
 # --- Data Models ---
 
-@dataclass
+# slots=True needs Python 3.10+; older interpreters fall back to a regular __dict__
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_SLOTS)
 class CartItem:
     item_id: str
     name: str
     price: float
     quantity: int
     notes: Optional[str] = None
+    # Derived from name; to_dict leaves it out of the saved order
+    name_lower: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.name_lower = self.name.lower()
 
     @property
     def total_price(self):
         return self.price * self.quantity
 
+    def to_dict(self):
+        return {
+            "item_id": self.item_id,
+            "name": self.name,
+            "price": self.price,
+            "quantity": self.quantity,
+            "notes": self.notes,
+        }
+
 @dataclass
 class SessionState:
     cart: List[CartItem] = field(default_factory=list)
-    
-    @property
-    def cart_total(self):
-        return sum(item.total_price for item in self.cart)
+    # item_id -> CartItem, kept in sync with `cart` for O(1) lookups
+    cart_index: Dict[str, CartItem] = field(default_factory=dict)
+    # Running total, updated on every cart change instead of re-summing the cart
+    cart_total: float = field(default=0.0)
+
+    def add_to_total(self, amount: float):
+        # Round so repeated float adds/subtracts don't drift off whole cents
+        self.cart_total = round(self.cart_total + amount, 2)
 
 # --- Helpers ---
 
 def load_catalog():
     if not os.path.exists(CATALOG_FILE):
         return []
-    with open(CATALOG_FILE, "r") as f:
-        return json.load(f)
+    with open(CATALOG_FILE, "rb") as f:
+        return orjson.loads(f.read())
 
 CATALOG = load_catalog()
+CATALOG_BY_ID = {p["id"]: p for p in CATALOG}
+CATALOG_BY_ID_LOWER = {p["id"].lower(): p for p in CATALOG}
+CATALOG_BY_NAME_LOWER = {p["name"].lower(): p for p in CATALOG}
+# Lowercased names as a flat list parallel to CATALOG (index i <-> CATALOG[i]);
+# rapidfuzz scores a plain list of strings without walking dict items
+CATALOG_NAMES_LOWER = [p["name"].lower() for p in CATALOG]
 
 # Hardcoded recipe map for the "smart add" feature
 RECIPES = {
@@ -70,29 +104,91 @@ RECIPES = {
     "omelette": ["g_eggs", "g_milk"],
     "pizza": ["p_pizza", "s_chips"] # Suggesting chips with pizza as a combo
 }
+# Spoken variants that should land on an existing recipe
+RECIPE_ALIASES = {
+    "spag": "spaghetti",
+    "pb&j": "pbj",
+    "pb and j": "pbj",
+    "omelet": "omelette",
+}
+RECIPE_LOOKUP = {**{k: k for k in RECIPES}, **RECIPE_ALIASES}
+# One alternation over every key/alias: a single scan of the dish name finds the
+# first mention. Longest patterns go first so "spaghetti" wins over "spag".
+RECIPE_RE = re.compile("|".join(re.escape(k) for k in sorted(RECIPE_LOOKUP, key=len, reverse=True)))
+# Recipe key -> product dicts, resolved once; ids missing from the catalog are dropped
+RECIPES_RESOLVED = {
+    k: [CATALOG_BY_ID[pid] for pid in ids if pid in CATALOG_BY_ID]
+    for k, ids in RECIPES.items()
+}
 
 def find_item_in_catalog(query: str):
-    """Simple fuzzy search for catalog items."""
-    query = query.lower()
-    for item in CATALOG:
-        # Match ID or Name
-        if query in item["name"].lower() or item["id"] == query:
-            return item
+    """Fuzzy search for catalog items; tolerates typos like 'spagetti'."""
+    q = query.strip().lower()
+    if not q:
+        return None
+    # Exact ID or name hits are O(1); only misses pay for the scans below
+    product = CATALOG_BY_ID_LOWER.get(q) or CATALOG_BY_NAME_LOWER.get(q)
+    if product:
+        return product
+    for i, name in enumerate(CATALOG_NAMES_LOWER):
+        if q in name:
+            return CATALOG[i]
+    # Short fragments ("tea", "ham") score high against any name sharing a few
+    # letters, so only longer queries get typo matching
+    if len(q) < FUZZY_MIN_QUERY_LEN:
+        return None
+    match = process.extractOne(
+        q, CATALOG_NAMES_LOWER, scorer=fuzz.partial_ratio, score_cutoff=FUZZY_SCORE_CUTOFF
+    )
+    if match:
+        return CATALOG[match[2]]
     return None
 
-def save_order(order_data):
-    """Appends order to orders.json"""
-    history = []
-    if os.path.exists(ORDERS_FILE):
-        with open(ORDERS_FILE, "r") as f:
+def load_orders():
+    """Reads every saved order from orders.jsonl (one JSON object per line)."""
+    # A missing or freshly created file has nothing to parse
+    if not os.path.exists(ORDERS_FILE) or os.path.getsize(ORDERS_FILE) == 0:
+        return []
+    orders = []
+    with open(ORDERS_FILE, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
             try:
-                history = json.load(f)
-            except:
-                pass
-    
-    history.append(order_data)
-    with open(ORDERS_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+                orders.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # e.g. a trailing line cut short by a crash mid-append
+                logger.warning(f"Skipping malformed order line in {ORDERS_FILE}")
+    return orders
+
+# Deployments from before the JSONL switch keep their order history
+migrate_json_array_to_jsonl(LEGACY_ORDERS_FILE, ORDERS_FILE)
+
+def _save_order_sync(order_data):
+    # Append-only: past orders never change, so never rewrite them
+    with open(ORDERS_FILE, "ab") as f:
+        f.write(orjson.dumps(order_data) + b"\n")
+
+# Saves still being written; flush_orders() waits on these at shutdown
+_pending_saves: Set[asyncio.Task] = set()
+
+def _on_save_done(task: asyncio.Task):
+    _pending_saves.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Failed to save order: {task.exception()}")
+
+def save_order(order_data) -> asyncio.Task:
+    """Starts appending the order to orders.jsonl in the background."""
+    task = asyncio.create_task(asyncio.to_thread(_save_order_sync, order_data))
+    _pending_saves.add(task)
+    task.add_done_callback(_on_save_done)
+    return task
+
+async def flush_orders():
+    """Wait for every in-flight order save to finish."""
+    if _pending_saves:
+        await asyncio.gather(*_pending_saves, return_exceptions=True)
 
 # --- Agent ---
 
@@ -125,7 +221,8 @@ class GroceryAgent(Agent):
             return f"Sorry, I couldn't find '{item_name}' in our catalog. We have bread, milk, eggs, pasta, pizza, etc."
 
         # Check if item already in cart
-        existing = next((i for i in ctx.userdata.cart if i.item_id == product["id"]), None)
+        existing = ctx.userdata.cart_index.get(product["id"])
+        ctx.userdata.add_to_total(product["price"] * quantity)
         if existing:
             existing.quantity += quantity
             if notes: existing.notes = notes # Update notes if provided
@@ -139,6 +236,7 @@ class GroceryAgent(Agent):
                 notes=notes
             )
             ctx.userdata.cart.append(new_item)
+            ctx.userdata.cart_index[new_item.item_id] = new_item
             return f"Added {quantity}x {product['name']} to cart. Cart Total: ${ctx.userdata.cart_total:.2f}"
 
     @function_tool
@@ -147,10 +245,13 @@ class GroceryAgent(Agent):
         Remove an item from the cart.
         """
         # Try to match name
-        target = next((i for i in ctx.userdata.cart if item_name.lower() in i.name.lower()), None)
+        query = item_name.lower()
+        target = next((i for i in ctx.userdata.cart if query in i.name_lower), None)
         
         if target:
             ctx.userdata.cart.remove(target)
+            del ctx.userdata.cart_index[target.item_id]
+            ctx.userdata.add_to_total(-target.total_price)
             return f"Removed {target.name} from cart."
         else:
             return f"Item '{item_name}' not found in your cart."
@@ -178,26 +279,26 @@ class GroceryAgent(Agent):
         Supported dishes: sandwich, pasta, omelette.
         """
         # Find matching recipe key
-        recipe_key = next((k for k in RECIPES.keys() if k in dish_name.lower()), None)
+        match = RECIPE_RE.search(dish_name.lower())
+        recipe_key = RECIPE_LOOKUP[match.group()] if match else None
         
         if not recipe_key:
             return f"I don't have a pre-set recipe for '{dish_name}'. Please ask for items individually (e.g., 'Add bread and peanut butter')."
         
         added_items = []
-        item_ids = RECIPES[recipe_key]
         
-        for pid in item_ids:
-            # Find product object
-            product = next((p for p in CATALOG if p["id"] == pid), None)
-            if product:
-                # Add to cart logic (simplified version of add_to_cart)
-                existing = next((i for i in ctx.userdata.cart if i.item_id == pid), None)
-                if existing:
-                    existing.quantity += quantity
-                else:
-                    new_item = CartItem(product["id"], product["name"], product["price"], quantity)
-                    ctx.userdata.cart.append(new_item)
-                added_items.append(product["name"])
+        for product in RECIPES_RESOLVED[recipe_key]:
+            # Add to cart logic (simplified version of add_to_cart)
+            pid = product["id"]
+            existing = ctx.userdata.cart_index.get(pid)
+            ctx.userdata.add_to_total(product["price"] * quantity)
+            if existing:
+                existing.quantity += quantity
+            else:
+                new_item = CartItem(pid, product["name"], product["price"], quantity)
+                ctx.userdata.cart.append(new_item)
+                ctx.userdata.cart_index[pid] = new_item
+            added_items.append(product["name"])
 
         return f"Added ingredients for {dish_name} ({', '.join(added_items)}) to your cart."
 
@@ -210,20 +311,25 @@ class GroceryAgent(Agent):
         if not ctx.userdata.cart:
             return "Cannot checkout. The cart is empty."
 
+        # One clock read so the ID and timestamp always agree
+        now = datetime.datetime.now(datetime.timezone.utc)
         order_data = {
-            "order_id": f"ORD-{int(datetime.datetime.now().timestamp())}",
-            "timestamp": str(datetime.datetime.now()),
+            "order_id": f"ORD-{int(now.timestamp())}",
+            "timestamp": now.isoformat(),
             "customer": customer_name,
-            "items": [asdict(i) for i in ctx.userdata.cart],
+            "items": [i.to_dict() for i in ctx.userdata.cart],
             "total": ctx.userdata.cart_total,
             "status": "placed"
         }
 
+        # The order ID is already known, so reply without waiting on the disk
         save_order(order_data)
         
         # Clear cart
         final_total = ctx.userdata.cart_total
         ctx.userdata.cart = []
+        ctx.userdata.cart_index = {}
+        ctx.userdata.cart_total = 0.0
         
         return f"Order placed successfully! Total charged: ${final_total:.2f}. Your order ID is {order_data['order_id']}."
 
@@ -247,7 +353,7 @@ async def entrypoint(ctx: JobContext):
             tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
             text_pacing=True
         ),
-        turn_detection=MultilingualModel(),
+        turn_detection=get_turn_detector(ctx.proc),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
     )
@@ -264,6 +370,7 @@ async def entrypoint(ctx: JobContext):
         logger.info(f"Usage: {summary}")
 
     ctx.add_shutdown_callback(log_usage)
+    ctx.add_shutdown_callback(flush_orders)
 
     await session.start(
         agent=GroceryAgent(),
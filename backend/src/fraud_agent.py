@@ -4,7 +4,7 @@ import os
 import asyncio
 from typing import Annotated, Optional
 from dataclasses import dataclass
-from dotenv import load_dotenv
+import _env  # noqa: F401 - loads .env.local
 
 from livekit.agents import (
     Agent,
@@ -24,7 +24,6 @@ from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("fraud-agent")
-load_dotenv(".env.local")
 
 DB_FILE = "fraud_db.json"
 
@@ -1,6 +1,7 @@
 import logging
 import random
-from dotenv import load_dotenv
+import _env  # noqa: F401 - loads .env.local
+from _turn_detector import get_turn_detector
 
 from livekit.agents import (
     Agent,
@@ -17,10 +18,11 @@ from livekit.agents import (
     RunContext,
 )
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("game-master")
-load_dotenv(".env.local")
+
+# Bound method of a private generator: a d20 roll is one float multiply
+_rand = random.Random().random
 
 class GameMaster(Agent):
     def __init__(self):
@@ -58,7 +60,7 @@ class GameMaster(Agent):
             skill_check_name: The type of action being attempted (e.g., "Hacking", "Stealth", "Athletics").
             difficulty_class: The target number to beat (default 15).
         """
-        roll = random.randint(1, 20)
+        roll = int(_rand() * 20) + 1
         
         outcome = "SUCCESS" if roll >= difficulty_class else "FAILURE"
         
@@ -79,7 +81,7 @@ async def entrypoint(ctx: JobContext):
             tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
             text_pacing=True
         ),
-        turn_detection=MultilingualModel(),
+        turn_detection=get_turn_detector(ctx.proc),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
     )
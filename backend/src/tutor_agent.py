@@ -1,8 +1,10 @@
+import functools
 import logging
-import json
+import orjson
 import os
 from typing import Annotated, Literal, Optional
-from dotenv import load_dotenv
+import _env  # noqa: F401 - loads .env.local
+from _turn_detector import get_turn_detector
 
 from livekit.agents import (
     Agent,
@@ -19,10 +21,8 @@ from livekit.agents import (
     RunContext,
 )
 from livekit.plugins import murf, silero, google, deepgram, noise_cancellation
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("tutor-agent")
-load_dotenv(".env.local")
 
 # --- Content Loading ---
 CONTENT_FILE = "day4_tutor_content.json"
@@ -31,19 +31,22 @@ def load_content():
     if not os.path.exists(CONTENT_FILE):
         logger.warning("Content file not found!")
         return []
-    with open(CONTENT_FILE, "r") as f:
-        return json.load(f)
+    with open(CONTENT_FILE, "rb") as f:
+        return orjson.loads(f.read())
 
 COURSE_CONTENT = load_content()
 TOPIC_IDS = [t["id"] for t in COURSE_CONTENT]
+TOPICS_BY_ID_LOWER = {t["id"].lower(): t for t in COURSE_CONTENT}
 
 def get_topic(topic_id: str):
     if not topic_id:
         return None
-    # Case-insensitive search
-    return next((t for t in COURSE_CONTENT if t["id"].lower() == topic_id.lower()), None)
+    # Case-insensitive lookup
+    return TOPICS_BY_ID_LOWER.get(topic_id.lower())
 
 # --- TTS Helper ---
+# One TTS per voice: mode switches reuse it instead of building a new client
+@functools.lru_cache(maxsize=None)
 def get_tts(voice_id: str):
     return murf.TTS(
         voice=voice_id,
@@ -52,6 +55,90 @@ def get_tts(voice_id: str):
         text_pacing=True
     )
 
+# --- Instructions ---
+# Course content is static, so instructions are formatted once at import time
+_TOPIC_LIST_STR = ", ".join(t["title"] for t in COURSE_CONTENT)
+
+GREETING_INSTRUCTIONS = f"""
+                You are the receptionist for the Active Recall Tutor.
+                Available Topics: {_TOPIC_LIST_STR}.
+                
+                Your goal:
+                1. Greet the user.
+                2. List the available topics.
+                3. Ask them to choose a topic and a mode (Learn, Quiz, or Teach-Back).
+                4. Use the `switch_mode` tool to connect them to the right agent.
+            """
+
+def learn_instructions(topic_id: str) -> str:
+    topic = get_topic(topic_id)
+    # Safety check if topic is None
+    title = topic['title'] if topic else topic_id
+    summary = topic['summary'] if topic else "Content not found."
+
+    return f"""
+                You are the 'Learn' module. Your voice is Matthew.
+                Current Topic: {title}
+                Summary: {summary}
+                
+                Your goal: Explain the concept clearly to the user.
+                - Use the summary provided.
+                - Elaborate with simple examples.
+                - After explaining, ask if they want to switch to 'Quiz' mode or 'Teach-Back' mode to test their knowledge.
+            """
+
+def quiz_instructions(topic_id: str) -> str:
+    topic = get_topic(topic_id)
+    # Safety check
+    title = topic['title'] if topic else topic_id
+    sample_q = topic['sample_question'] if topic else "No question found."
+
+    return f"""
+                You are the 'Quiz' module. Your voice is Alicia.
+                Current Topic: {title}
+                Sample Question: {sample_q}
+                
+                Your goal: Test the user's knowledge.
+                - Ask the sample question or variations of it.
+                - Evaluate their answer.
+                - If they get it right, suggest switching to 'Teach-Back' mode.
+            """
+
+def teach_back_instructions(topic_id: str) -> str:
+    topic = get_topic(topic_id)
+    title = topic['title'] if topic else topic_id
+
+    return f"""
+                You are the 'Teach-Back' module. Your voice is Ken.
+                Current Topic: {title}
+                
+                Your goal: Act as a curious student. Ask the USER to explain the concept to YOU.
+                - Say: "Okay, I'm ready to learn. How would you explain {title} to me?"
+                - Listen to their explanation.
+                - Give feedback: "That made sense!" or "I'm confused about X."
+                - Grade them qualitatively (Great, Good, Needs Improvement).
+            """
+
+_INSTRUCTION_BUILDERS = {
+    "learn": learn_instructions,
+    "quiz": quiz_instructions,
+    "teach_back": teach_back_instructions,
+}
+
+# Room for every (mode, topic) pair plus a few unknown topic ids
+@functools.lru_cache(maxsize=len(TOPIC_IDS) * len(_INSTRUCTION_BUILDERS) + 16)
+def build_instructions(mode: str, topic_id: str) -> str:
+    # Revisiting a topic in the same mode reuses the exact same string
+    return _INSTRUCTION_BUILDERS[mode](topic_id)
+
+def warm_instructions():
+    # Build every known (mode, topic) pair so the first switch is a lookup too
+    for topic_id in TOPIC_IDS:
+        for mode in _INSTRUCTION_BUILDERS:
+            build_instructions(mode, topic_id)
+
+warm_instructions()
+
 # --- Base Tutor Agent (Shared Tools) ---
 class BaseTutorAgent(Agent):
     def __init__(self, current_topic_id: Optional[str] = None, **kwargs):
@@ -91,23 +178,9 @@ class BaseTutorAgent(Agent):
 
 class LearnAgent(BaseTutorAgent):
     def __init__(self, topic_id: str):
-        topic = get_topic(topic_id)
-        # Safety check if topic is None
-        title = topic['title'] if topic else topic_id
-        summary = topic['summary'] if topic else "Content not found."
-        
         super().__init__(
             current_topic_id=topic_id,
-            instructions=f"""
-                You are the 'Learn' module. Your voice is Matthew.
-                Current Topic: {title}
-                Summary: {summary}
-                
-                Your goal: Explain the concept clearly to the user.
-                - Use the summary provided.
-                - Elaborate with simple examples.
-                - After explaining, ask if they want to switch to 'Quiz' mode or 'Teach-Back' mode to test their knowledge.
-            """
+            instructions=build_instructions("learn", topic_id),
         )
 
     async def on_enter(self, **kwargs):
@@ -120,23 +193,9 @@ class LearnAgent(BaseTutorAgent):
 
 class QuizAgent(BaseTutorAgent):
     def __init__(self, topic_id: str):
-        topic = get_topic(topic_id)
-        # Safety check
-        title = topic['title'] if topic else topic_id
-        sample_q = topic['sample_question'] if topic else "No question found."
-
         super().__init__(
             current_topic_id=topic_id,
-            instructions=f"""
-                You are the 'Quiz' module. Your voice is Alicia.
-                Current Topic: {title}
-                Sample Question: {sample_q}
-                
-                Your goal: Test the user's knowledge.
-                - Ask the sample question or variations of it.
-                - Evaluate their answer.
-                - If they get it right, suggest switching to 'Teach-Back' mode.
-            """
+            instructions=build_instructions("quiz", topic_id),
         )
 
     async def on_enter(self, **kwargs):
@@ -147,21 +206,9 @@ class QuizAgent(BaseTutorAgent):
 
 class TeachBackAgent(BaseTutorAgent):
     def __init__(self, topic_id: str):
-        topic = get_topic(topic_id)
-        title = topic['title'] if topic else topic_id
-
         super().__init__(
             current_topic_id=topic_id,
-            instructions=f"""
-                You are the 'Teach-Back' module. Your voice is Ken.
-                Current Topic: {title}
-                
-                Your goal: Act as a curious student. Ask the USER to explain the concept to YOU.
-                - Say: "Okay, I'm ready to learn. How would you explain {title} to me?"
-                - Listen to their explanation.
-                - Give feedback: "That made sense!" or "I'm confused about X."
-                - Grade them qualitatively (Great, Good, Needs Improvement).
-            """
+            instructions=build_instructions("teach_back", topic_id),
         )
 
     async def on_enter(self, **kwargs):
@@ -172,19 +219,9 @@ class TeachBackAgent(BaseTutorAgent):
 
 class GreetingAgent(BaseTutorAgent):
     def __init__(self):
-        topic_list = ", ".join([t["title"] for t in COURSE_CONTENT])
         super().__init__(
             current_topic_id=None,
-            instructions=f"""
-                You are the receptionist for the Active Recall Tutor.
-                Available Topics: {topic_list}.
-                
-                Your goal:
-                1. Greet the user.
-                2. List the available topics.
-                3. Ask them to choose a topic and a mode (Learn, Quiz, or Teach-Back).
-                4. Use the `switch_mode` tool to connect them to the right agent.
-            """
+            instructions=GREETING_INSTRUCTIONS,
         )
 
     async def on_enter(self, **kwargs):
@@ -206,7 +243,7 @@ async def entrypoint(ctx: JobContext):
         stt=deepgram.STT(model="nova-3"),
         llm=google.LLM(model="gemini-2.5-flash"),
         tts=get_tts("en-US-matthew"), # Start with Matthew
-        turn_detection=MultilingualModel(),
+        turn_detection=get_turn_detector(ctx.proc),
         vad=ctx.proc.userdata["vad"],
         preemptive_generation=True,
     )
@@ -4,7 +4,7 @@ import os
 from datetime import datetime
 from typing import List, Optional
 from dataclasses import dataclass, field, asdict
-from dotenv import load_dotenv
+import _env  # noqa: F401 - loads .env.local
 
 from livekit.agents import (
     Agent,
@@ -25,8 +25,6 @@ from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
 logger = logging.getLogger("wellness-agent")
 
-load_dotenv(".env.local")
-
 DB_FILE = "wellness_log.json"
 
 # --- Data Models ---
@@ -0,0 +1,42 @@
+import pytest
+
+import acp_agent
+from acp_agent import filter_catalog
+
+
+@pytest.fixture(autouse=True)
+def _fresh_filter_cache():
+    filter_catalog.cache_clear()
+    yield
+    filter_catalog.cache_clear()
+
+
+def test_list_products_caps_results(monkeypatch) -> None:
+    """Long result lists are cut off with a note saying so."""
+    monkeypatch.setattr(acp_agent, "MAX_LISTED_PRODUCTS", 2)
+
+    lines = filter_catalog("apparel", None, None, None).splitlines()
+
+    assert len(lines) == 3
+    assert lines[-1] == "(showing first 2)"
+
+
+def test_list_products_no_note_when_everything_fits(monkeypatch) -> None:
+    monkeypatch.setattr(acp_agent, "MAX_LISTED_PRODUCTS", len(acp_agent.CATALOG))
+
+    result = filter_catalog(None, None, None, None)
+
+    assert len(result.splitlines()) == len(acp_agent.CATALOG)
+    assert "showing first" not in result
+
+
+def test_search_matches_words_in_any_order() -> None:
+    result = filter_catalog(None, None, None, "hoodie black")
+
+    assert "hoodie-blk-m" in result
+    assert "hoodie-blk-l" in result
+    assert "hoodie-blue-m" not in result
+
+
+def test_search_requires_every_word() -> None:
+    assert filter_catalog(None, None, None, "blue mug") == "No products found matching those criteria."
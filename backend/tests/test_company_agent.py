@@ -0,0 +1,13 @@
+from company_agent import search_knowledge_base
+
+
+def test_lookup_matches_keyword_inside_longer_word() -> None:
+    """'documentation' should still hit the 'document' keyword."""
+    result = search_knowledge_base("What documentation do I need?")
+    assert "Is documentation required?" in result
+
+
+def test_lookup_matches_irregular_plural() -> None:
+    """'taxes' should still hit the 'tax' keyword on Razorpay Payroll."""
+    result = search_knowledge_base("do you handle taxes")
+    assert "Razorpay Payroll" in result
@@ -0,0 +1,26 @@
+import orjson
+
+from _files import migrate_json_array_to_jsonl
+
+
+def test_migrates_legacy_order_history(tmp_path) -> None:
+    legacy = tmp_path / "orders.json"
+    target = tmp_path / "orders.jsonl"
+    legacy.write_bytes(orjson.dumps([{"id": 1}, {"id": 2}]))
+
+    assert migrate_json_array_to_jsonl(str(legacy), str(target)) == 2
+    assert [orjson.loads(line) for line in target.read_bytes().splitlines()] == [
+        {"id": 1},
+        {"id": 2},
+    ]
+    assert legacy.exists()
+
+
+def test_migration_skips_existing_jsonl(tmp_path) -> None:
+    legacy = tmp_path / "orders.json"
+    target = tmp_path / "orders.jsonl"
+    legacy.write_bytes(orjson.dumps([{"id": 1}]))
+    target.write_bytes(b'{"id": 9}\n')
+
+    assert migrate_json_array_to_jsonl(str(legacy), str(target)) == 0
+    assert target.read_bytes() == b'{"id": 9}\n'
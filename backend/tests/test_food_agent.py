@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+
+import food_agent
+from food_agent import RECIPE_LOOKUP, RECIPE_RE, GroceryAgent, SessionState, find_item_in_catalog
+
+
+def _ctx() -> SimpleNamespace:
+    return SimpleNamespace(userdata=SessionState())
+
+
+@pytest.mark.parametrize("query", ["tea", "ham", "ice", "pie", "nuts"])
+def test_find_item_rejects_unrelated_fragments(query: str) -> None:
+    """Items not in the catalog return None so the agent asks again."""
+    assert find_item_in_catalog(query) is None
+
+
+@pytest.mark.parametrize(
+    ("query", "name"),
+    [
+        ("spagetti", "Spaghetti Pasta"),
+        ("peanut buter", "Creamy Peanut Butter"),
+        ("milk", "Organic Milk"),
+        ("G_BREAD", "Whole Wheat Bread"),
+    ],
+)
+def test_find_item_resolves_typos_and_substrings(query: str, name: str) -> None:
+    assert find_item_in_catalog(query)["name"] == name
+
+
+@pytest.mark.parametrize(
+    ("dish", "recipe"),
+    [
+        ("spaghetti bolognese", "spaghetti"),
+        ("some spag please", "spaghetti"),
+        ("a cheese omelet", "omelette"),
+        ("pb and j", "pbj"),
+        ("pizza and pasta night", "pizza"),
+    ],
+)
+def test_recipe_regex_resolves_aliases_and_first_mention(dish: str, recipe: str) -> None:
+    assert RECIPE_LOOKUP[RECIPE_RE.search(dish).group()] == recipe
+
+
+@pytest.mark.asyncio
+async def test_add_recipe_ingredients_fills_cart() -> None:
+    ctx = _ctx()
+    result = await GroceryAgent().add_recipe_ingredients(ctx, "an omelet")
+
+    assert "Large Eggs (Dozen)" in result
+    assert [i.item_id for i in ctx.userdata.cart] == ["g_eggs", "g_milk"]
+
+
+def _summed_total(state: SessionState) -> float:
+    return round(sum(i.total_price for i in state.cart), 2)
+
+
+@pytest.mark.asyncio
+async def test_cart_total_tracks_add_remove_and_recipes() -> None:
+    agent, ctx = GroceryAgent(), _ctx()
+
+    await agent.add_to_cart(ctx, "bread", quantity=2)
+    await agent.add_to_cart(ctx, "milk")
+    await agent.add_recipe_ingredients(ctx, "sandwich")
+    assert ctx.userdata.cart_total == _summed_total(ctx.userdata)
+
+    await agent.remove_from_cart(ctx, "milk")
+    assert ctx.userdata.cart_total == _summed_total(ctx.userdata)
+
+
+@pytest.mark.asyncio
+async def test_checkout_saves_total_and_resets_cart(monkeypatch) -> None:
+    saved = []
+    monkeypatch.setattr(food_agent, "save_order", saved.append)
+    agent, ctx = GroceryAgent(), _ctx()
+    await agent.add_to_cart(ctx, "eggs", quantity=3)
+    expected = _summed_total(ctx.userdata)
+
+    await agent.checkout(ctx, "Sam")
+
+    assert saved[0]["total"] == expected
+    assert ctx.userdata.cart_total == 0.0
+    assert not ctx.userdata.cart and not ctx.userdata.cart_index